@@ -193,6 +193,7 @@ class WIZNET5K:  # pylint: disable=too-many-public-methods, too-many-instance-at
         self.mac_address = mac
         self.src_port = 0
         self._dns = (0, 0, 0, 0)
+        self._dns_client = None
         # udp related
         self.udp_datasize = [0] * self.max_sockets
         self.udp_from_ip = [b"\x00\x00\x00\x00"] * self.max_sockets
@@ -267,14 +268,17 @@ class WIZNET5K:  # pylint: disable=too-many-public-methods, too-many-instance-at
         """
         if self._debug:
             print("* Get host by name")
-        if isinstance(hostname, str):
-            hostname = bytes(hostname, "utf-8")
-        # Return IP assigned by DHCP
-        _dns_client = dns.DNS(self, self._dns, debug=self._debug)
-        ret = _dns_client.gethostbyname(hostname)
+        # Reuse the DNS client so that its cache persists between lookups
+        if self._dns_client is None:
+            self._dns_client = dns.DNS(self, self._dns, debug=self._debug)
+        try:
+            ret = self._dns_client.gethostbyname(hostname)
+        finally:
+            # Give the hardware socket back, only the cache needs to be kept
+            self._dns_client.close()
         if self._debug:
             print("* Resolved IP: ", ret)
-        if ret == -1:
+        if isinstance(ret, int):
             raise RuntimeError("Failed to resolve hostname!")
         return ret
 
@@ -450,6 +454,9 @@ class WIZNET5K:  # pylint: disable=too-many-public-methods, too-many-instance-at
         self.write(REG_SUBR, 0x04, subnet_mask)
         self.write(REG_GAR, 0x04, gateway_address)
 
+        if dns_server != self._dns:
+            # Cached answers belong to the previous DNS server
+            self._dns_client = None
         self._dns = dns_server
 
     def _w5xxx_init(self) -> int:
@@ -16,7 +16,7 @@ ethernet modules.
 from __future__ import annotations
 
 try:
-    from typing import TYPE_CHECKING, Union, Tuple
+    from typing import TYPE_CHECKING, List, Optional, Union, Tuple
 
     if TYPE_CHECKING:
         from adafruit_wiznet5k.adafruit_wiznet5k import WIZNET5K
@@ -24,10 +24,10 @@ except ImportError:
     pass
 
 import time
+import struct
 from random import getrandbits
 from micropython import const
 import adafruit_wiznet5k.adafruit_wiznet5k_socket as socket
-from adafruit_wiznet5k.adafruit_wiznet5k_socket import htons
 
 QUERY_FLAG = const(0x00)
 OPCODE_STANDARD_QUERY = const(0x00)
@@ -45,6 +45,28 @@ TRUNCATED = const(-3)
 INVALID_RESPONSE = const(-4)
 
 DNS_PORT = const(0x35)  # port used for DNS request
+_DNS_MAX_PACKET = const(512)  # largest DNS message carried over UDP
+# Seconds to wait for a response to each attempt at sending a request
+_RETRY_TIMEOUTS = (1.0, 0.5, 0.25)
+
+# struct formats for the fixed size parts of a DNS message
+_DNS_HEADER = ">HHHHHH"  # ID, flags, QDCOUNT, ANCOUNT, NSCOUNT, ARCOUNT
+_DNS_QUESTION_FIXED = ">HH"  # QTYPE, QCLASS
+_DNS_RR_FIXED = ">HHIH"  # TYPE, CLASS, TTL, RDLENGTH
+
+# Constant parts of a query
+# Flags (recursion desired), QDCOUNT = 1, ANCOUNT = NSCOUNT = ARCOUNT = 0
+_DNS_HEADER_TAIL = b"\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+# End of the name, Type A record, Class IN
+_DNS_QUESTION_TAIL = b"\x00\x00\x01\x00\x01"
+
+# Bounds, in seconds, applied to the TTL of cached answers
+MIN_TTL = const(60)
+MAX_TTL = const(3600)
+# Time, in seconds, to remember a failed lookup
+NEGATIVE_TTL = const(30)
+# Most host names held in the cache
+_MAX_CACHE_ENTRIES = const(16)
 
 
 class DNS:
@@ -64,76 +86,156 @@ class DNS:
         self._debug = debug
         self._iface = iface
         socket.set_interface(iface)
-        self._sock = socket.socket(type=socket.SOCK_DGRAM)
-        self._sock.settimeout(1)
+        self._sock = None
 
+        if isinstance(dns_address, str):
+            # parse the address once rather than on every send
+            dns_address = tuple(iface.unpretty_ip(dns_address))
         self._dns_server = dns_address
         self._host = b""
         self._request_id = 0  # request identifier
+        # The query packet, owned by this instance and rewritten in place for each query
         self._pkt_buf = bytearray()
+        self._resp_buf = b""  # the last response received
+        # {hostname: (address or error code, expiry time)}
+        self._cache = {}
 
-    def gethostbyname(self, hostname: bytes) -> Union[int, bytes]:
+    def gethostbyname(self, hostname: Union[str, bytes]) -> Union[int, bytes]:
         """
         DNS look up of a host name.
 
-        :param bytes hostname: Host name to connect to.
+        Answers are cached for the TTL returned by the server, clamped to
+        MIN_TTL..MAX_TTL seconds. Timeouts and invalid responses are cached for
+        NEGATIVE_TTL seconds.
 
-        :return Union[int, bytes] The IPv4 address if successful, -1 otherwise.
+        :param Union[str, bytes] hostname: Host name to connect to.
+
+        :return Union[int, bytes] The IPv4 address if successful, otherwise one of the
+            negative return codes TIMED_OUT, INVALID_SERVER, TRUNCATED or INVALID_RESPONSE.
         """
         if self._dns_server is None:
             return INVALID_SERVER
+        # host names are ASCII only, keep them as bytes from here on
+        if isinstance(hostname, str):
+            hostname = hostname.encode("ascii")
+        key = hostname.lower()
+        addr = self._cache_lookup(key)
+        if addr is not None:
+            if self._debug:
+                print("* DNS: Cached response for", hostname)
+            return addr
         self._host = hostname
         # build DNS request packet
-        self._build_dns_header()
-        self._build_dns_question()
+        self._build_dns_query()
 
-        # Send DNS request packet
-        self._sock.bind((None, DNS_PORT))
-        self._sock.connect((self._dns_server, DNS_PORT))
-        if self._debug:
-            print("* DNS: Sending request packet...")
-        self._sock.send(self._pkt_buf)
-
-        # wait and retry 3 times for a response
-        retries = 0
-        addr = -1
-        while (retries < 5) and (addr == -1):
-            addr = self._parse_dns_response()
-            if addr == -1 and self._debug:
+        # the socket is kept open between lookups
+        if self._sock is None:
+            self._sock = socket.socket(type=socket.SOCK_DGRAM)
+            self._sock.bind((None, DNS_PORT))
+
+        # Send DNS request packet, resending it if no response arrives in time
+        addr = TIMED_OUT
+        for timeout in _RETRY_TIMEOUTS:
+            if self._debug:
+                print("* DNS: Sending request packet...")
+            self._sock.sendto(self._pkt_buf, (self._dns_server, DNS_PORT))
+            addr, ttl = self._parse_dns_response(timeout)
+            # any response other than a timeout is final
+            if addr != TIMED_OUT:
+                break
+            if self._debug:
                 print("* DNS ERROR: Failed to resolve DNS response, retrying...")
-            retries += 1
 
-        self._sock.close()
+        if isinstance(addr, int):
+            # A truncated response is not an answer, so ask again next time
+            if addr == TRUNCATED:
+                return addr
+            ttl = NEGATIVE_TTL
+        self._cache_store(key, addr, ttl)
         return addr
 
+    def close(self) -> None:
+        """Close the socket used for lookups. The next lookup opens a new one."""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def flush(self) -> None:
+        """Discard all cached DNS answers."""
+        self._cache = {}
+
+    def _cache_lookup(self, hostname: bytes) -> Optional[Union[int, bytes]]:
+        """
+        Look up a host name in the cache, discarding the entry if it has expired.
+
+        :param bytes hostname: Lower-cased host name.
+
+        :return Optional[Union[int, bytes]]: The cached address or error code, None if
+            not cached.
+        """
+        entry = self._cache.get(hostname)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            del self._cache[hostname]
+            return None
+        return entry[0]
+
+    def _cache_store(self, hostname: bytes, addr: Union[int, bytes], ttl: int) -> None:
+        """
+        Add a result to the cache, first discarding expired entries and, if the cache
+        is still full, the entry that expires soonest.
+
+        :param bytes hostname: Lower-cased host name.
+        :param Union[int, bytes] addr: The address or error code to cache.
+        :param int ttl: Seconds to keep the result for.
+        """
+        now = time.monotonic()
+        for name in [name for name, entry in self._cache.items() if entry[1] < now]:
+            del self._cache[name]
+        if hostname not in self._cache and len(self._cache) >= _MAX_CACHE_ENTRIES:
+            oldest = min(self._cache, key=lambda name: self._cache[name][1])
+            del self._cache[oldest]
+        self._cache[hostname] = (addr, now + ttl)
+
     def _parse_dns_response(
         self,
-    ) -> Union[int, bytes]:
+        timeout: float,
+    ) -> Tuple[Union[int, bytes], int]:
         # pylint: disable=too-many-return-statements, too-many-branches, too-many-statements, too-many-locals
         """
         Receive and parse DNS query response.
 
-        :return Union[int, bytes]: Requested hostname IP address if obtained, -1 otherwise.
+        :param float timeout: Seconds to wait for the response to this request.
+
+        :return Tuple[Union[int, bytes], int]: Requested hostname IP address and the number
+            of seconds it may be cached for if obtained. Otherwise TIMED_OUT if there was
+            no response to this request, TRUNCATED or INVALID_RESPONSE, and 0.
         """
-        # wait for a response
-        start_time = time.monotonic()
-        packet_sz = self._sock.available()
-        while packet_sz <= 0:
-            packet_sz = self._sock.available()
-            if (time.monotonic() - start_time) > 1.0:
+        # wait, up to timeout, for the response to this request and recv packet into buf
+        deadline = time.monotonic() + timeout
+        self._sock.settimeout(timeout)
+        while True:
+            self._resp_buf = self._sock.recv(_DNS_MAX_PACKET)
+            if not self._resp_buf:
                 if self._debug:
                     print("* DNS ERROR: Did not receive DNS response!")
-                return -1
-            time.sleep(0.05)
-        # recv packet into buf
-        self._pkt_buf = self._sock.recv()
+                return TIMED_OUT, 0
 
-        if self._debug:
-            print("DNS Packet Received: ", self._pkt_buf)
+            if self._debug:
+                print("DNS Packet Received: ", self._resp_buf)
 
-        # Validate request identifier
-        xid = int.from_bytes(self._pkt_buf[0:2], "big")
-        if not xid == self._request_id:
+            if len(self._resp_buf) < 12:
+                if self._debug:
+                    print("* DNS ERROR: Response too short for a header")
+                return INVALID_RESPONSE, 0
+            xid, flags, qr_count, an_count, _, _ = struct.unpack_from(
+                _DNS_HEADER, self._resp_buf, 0
+            )
+
+            # Validate request identifier
+            if xid == self._request_id:
+                break
             if self._debug:
                 print(
                     "* DNS ERROR: Received request identifier {} \
@@ -141,134 +243,143 @@ class DNS:
                         xid, self._request_id
                     )
                 )
-            return -1
+            # Not the response to this request, keep waiting for it for the rest
+            # of the timeout
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return TIMED_OUT, 0
+            self._sock.settimeout(remaining)
+
         # Validate flags
-        flags = int.from_bytes(self._pkt_buf[2:4], "big")
+        if flags & 0x0200:
+            if self._debug:
+                print("* DNS ERROR: Truncated response")
+            return TRUNCATED, 0
         if not flags in (0x8180, 0x8580):
             if self._debug:
                 print("* DNS ERROR: Invalid flags, ", flags)
-            return -1
+            return INVALID_RESPONSE, 0
         # Number of questions
-        qr_count = int.from_bytes(self._pkt_buf[4:6], "big")
         if not qr_count >= 1:
             if self._debug:
                 print("* DNS ERROR: Question count >=1, ", qr_count)
-            return -1
+            return INVALID_RESPONSE, 0
         # Number of answers
-        an_count = int.from_bytes(self._pkt_buf[6:8], "big")
         if self._debug:
             print("* DNS Answer Count: ", an_count)
         if not an_count >= 1:
-            return -1
+            return INVALID_RESPONSE, 0
 
         # Parse query
-        ptr = 12
-        name_len = 1
-        while name_len > 0:
-            # read the length of the name
-            name_len = self._pkt_buf[ptr]
-            if name_len == 0x00:
-                # we reached the end of this name
-                ptr += 1  # inc. pointer by 0x00
-                break
-            # advance pointer
-            ptr += name_len + 1
-
+        ptr = self._skip_name(12)
+        if ptr < 0 or ptr + 4 > len(self._resp_buf):
+            if self._debug:
+                print("* DNS ERROR: Response ends inside the question")
+            return INVALID_RESPONSE, 0
+        q_type, q_class = struct.unpack_from(_DNS_QUESTION_FIXED, self._resp_buf, ptr)
         # Validate Query is Type A
-        q_type = int.from_bytes(self._pkt_buf[ptr : ptr + 2], "big")
         if not q_type == TYPE_A:
             if self._debug:
                 print("* DNS ERROR: Incorrect Query Type: ", q_type)
-            return -1
-        ptr += 2
-
-        # Validate Query is Type A
-        q_class = int.from_bytes(self._pkt_buf[ptr : ptr + 2], "big")
-        if not q_class == TYPE_A:
+            return INVALID_RESPONSE, 0
+        # Validate Query is Class IN
+        if not q_class == CLASS_IN:
             if self._debug:
                 print("* DNS ERROR: Incorrect Query Class: ", q_class)
-            return -1
-        ptr += 2
-
-        # Let's take the first type-a answer
-        if self._pkt_buf[ptr] != 0xC0:
-            return -1
-        ptr += 1
-
-        if self._pkt_buf[ptr] != 0xC:
-            return -1
-        ptr += 1
+            return INVALID_RESPONSE, 0
+        ptr += 4
 
-        # Validate Answer Type A
-        ans_type = int.from_bytes(self._pkt_buf[ptr : ptr + 2], "big")
-        if not ans_type == TYPE_A:
+        # Walk the answers and take the first type A, class IN, IPv4 one. Any
+        # records before it (e.g. a CNAME chain) also limit how long it is valid.
+        ttl = MAX_TTL
+        for _ in range(an_count):
+            ptr = self._skip_name(ptr)
+            if ptr < 0 or ptr + 10 > len(self._resp_buf):
+                if self._debug:
+                    print("* DNS ERROR: Response ends inside an answer")
+                return INVALID_RESPONSE, 0
+            ans_type, ans_class, ans_ttl, data_len = struct.unpack_from(
+                _DNS_RR_FIXED, self._resp_buf, ptr
+            )
+            ptr += 10
+            if ptr + data_len > len(self._resp_buf):
+                if self._debug:
+                    print("* DNS ERROR: Response ends inside answer data")
+                return INVALID_RESPONSE, 0
+            ttl = min(ttl, ans_ttl)
+            if ans_type == TYPE_A and ans_class == CLASS_IN and data_len == DATA_LEN:
+                # TTL, clamped to a sensible caching period
+                ttl = max(ttl, MIN_TTL)
+                # Return address
+                return self._resp_buf[ptr : ptr + 4], ttl
             if self._debug:
-                print("* DNS ERROR: Incorrect Answer Type: ", ans_type)
-            return -1
-        ptr += 2
+                print(
+                    "* DNS: Skipping answer type {}, class {}, length {}".format(
+                        ans_type, ans_class, data_len
+                    )
+                )
+            ptr += data_len
 
-        # Validate Answer Class IN
-        ans_class = int.from_bytes(self._pkt_buf[ptr : ptr + 2], "big")
-        if not ans_class == TYPE_A:
-            if self._debug:
-                print("* DNS ERROR: Incorrect Answer Class: ", ans_class)
-            return -1
-        ptr += 2
+        if self._debug:
+            print("* DNS ERROR: No IPv4 address in answers")
+        return INVALID_RESPONSE, 0
 
-        # skip over TTL
-        ptr += 4
+    def _skip_name(self, ptr: int) -> int:
+        """
+        Skip over a, possibly compressed, domain name in the received packet.
 
-        # Validate addr is IPv4
-        data_len = int.from_bytes(self._pkt_buf[ptr : ptr + 2], "big")
-        if not data_len == DATA_LEN:
-            if self._debug:
-                print("* DNS ERROR: Unexpected Data Length: ", data_len)
-            return -1
-        ptr += 2
-        # Return address
-        return self._pkt_buf[ptr : ptr + 4]
+        :param int ptr: Offset of the start of the name.
+
+        :return int: Offset of the first byte after the name, -1 if the name runs past
+            the end of the packet.
+        """
+        while ptr < len(self._resp_buf):
+            # read the length of this section of the name
+            name_len = self._resp_buf[ptr]
+            if name_len == 0x00:
+                # we reached the end of this name
+                return ptr + 1
+            if name_len & 0xC0 == 0xC0:
+                # a two byte pointer to the rest of the name ends it
+                return ptr + 2
+            # advance pointer
+            ptr += name_len + 1
+        return -1
+
+    def _build_dns_query(self) -> None:
+        """Build a DNS query packet for the current host name."""
+        labels = self._host.split(b".")
+        # header, then a length byte and the data for each section of host, the end
+        # of the name, the query type and the query class
+        size = 12 + len(labels) + sum(len(label) for label in labels) + 5
+        # every byte is overwritten below, so resize the buffer in place rather than
+        # allocating a new one
+        if len(self._pkt_buf) > size:
+            del self._pkt_buf[size:]
+        elif len(self._pkt_buf) < size:
+            self._pkt_buf.extend(bytes(size - len(self._pkt_buf)))
+        self._build_dns_header()
+        self._build_dns_question(labels)
 
     def _build_dns_header(self) -> None:
         """Build a DNS header."""
         # generate a random, 16-bit, request identifier
         self._request_id = getrandbits(16)
+        self._pkt_buf[0] = self._request_id >> 8
+        self._pkt_buf[1] = self._request_id & 0xFF
+        self._pkt_buf[2:12] = _DNS_HEADER_TAIL
 
-        # ID, 16-bit identifier
-        self._pkt_buf.append(self._request_id >> 8)
-        self._pkt_buf.append(self._request_id & 0xFF)
-
-        # Flags (0x0100)
-        self._pkt_buf.append(0x01)
-        self._pkt_buf.append(0x00)
-
-        # QDCOUNT
-        self._pkt_buf.append(0x00)
-        self._pkt_buf.append(0x01)
-        # ANCOUNT
-        self._pkt_buf.append(0x00)
-        self._pkt_buf.append(0x00)
-        # NSCOUNT
-        self._pkt_buf.append(0x00)
-        self._pkt_buf.append(0x00)
-        # ARCOUNT
-        self._pkt_buf.append(0x00)
-        self._pkt_buf.append(0x00)
-
-    def _build_dns_question(self) -> None:
-        """Build a DNS query."""
-        host = self._host.decode("utf-8")
-        host = host.split(".")
+    def _build_dns_question(self, labels: List[bytes]) -> None:
+        """
+        Build a DNS query.
+
+        :param List[bytes] labels: The sections of the host name.
+        """
+        ptr = 12
         # write out each section of host
-        for data in host:
-            # append the sz of the section
-            self._pkt_buf.append(len(data))
-            # append the section data
-            self._pkt_buf += bytes(data, "utf-8")
-        # end of the name
-        self._pkt_buf.append(0x00)
-        # Type A record
-        self._pkt_buf.append(htons(TYPE_A) & 0xFF)
-        self._pkt_buf.append(htons(TYPE_A) >> 8)
-        # Class IN
-        self._pkt_buf.append(htons(CLASS_IN) & 0xFF)
-        self._pkt_buf.append(htons(CLASS_IN) >> 8)
+        for label in labels:
+            self._pkt_buf[ptr] = len(label)
+            ptr += 1
+            self._pkt_buf[ptr : ptr + len(label)] = label
+            ptr += len(label)
+        self._pkt_buf[ptr:] = _DNS_QUESTION_TAIL
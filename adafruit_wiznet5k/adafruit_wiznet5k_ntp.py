@@ -27,11 +27,17 @@ try:
 except ImportError:
     pass
 import time
+import struct
 import adafruit_wiznet5k.adafruit_wiznet5k_socket as socket
 
 # __version__ = "0.0.0+auto.0"
 # __repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_NTP.git"
 
+_NTP_PACKET_SIZE = 48  # size of an NTP message without extensions
+# struct format and offset of the seconds part of the transmit timestamp
+_NTP_SEC = ">I"
+_NTP_SEC_OFFSET = 40
+
 
 class NTP:
     """Wiznet5k NTP Client."""
@@ -42,19 +48,24 @@ class NTP:
         ntp_address: str,
         utc: float,
         debug: bool = False,
+        min_resync: float = 60,
     ) -> None:
         """
         :param adafruit_wiznet5k.WIZNET5K iface: Wiznet 5k object.
         :param str ntp_address: The hostname of the NTP server.
         :param float utc: Numbers of hours to offset time from UTC.
         :param bool debug: Enable debugging output, defaults to False.
+        :param float min_resync: Seconds after a sync during which get_time uses the
+            local clock rather than the NTP server, defaults to 60.
         """
         self._debug = debug
         self._iface = iface
         socket.set_interface(self._iface)
         self._sock = socket.socket(type=socket.SOCK_DGRAM)
         self._sock.settimeout(1)
-        self._utc = utc
+        # UTC offset may be a float as some offsets are half hours so round to whole
+        # seconds once here.
+        self._utc_seconds = int(round(utc * 3600))
 
         self._ntp_server = ntp_address
         self._host = 0
@@ -62,20 +73,38 @@ class NTP:
 
         self._pkt_buf_ = bytearray([0x23] + [0x00] * 55)
 
+        self._min_resync_s = min_resync
+        self._last_sync_monotonic = None
+        self._last_sync_epoch = None
+
     def get_time(self) -> time.struct_time:
         """
         Get the time from the NTP server.
 
+        Within min_resync seconds of the last sync the time is worked out from the
+        local clock instead of asking the server again.
+
         :return time.struct_time: The local time.
+
+        :raises RuntimeError: If the server does not respond within the socket timeout.
         """
+        now = time.monotonic()
+        if (
+            self._last_sync_monotonic is not None
+            and now - self._last_sync_monotonic < self._min_resync_s
+        ):
+            return time.localtime(
+                self._last_sync_epoch + int(now - self._last_sync_monotonic)
+            )
         self._sock.bind((None, 50001))
         self._sock.sendto(self._pkt_buf_, (self._ntp_server, 123))
-        while True:
-            data = self._sock.recv()
-            if data:
-                sec = data[40:44]
-                int_cal = int.from_bytes(sec, "big")
-                # UTC offset may be a float as some offsets are half hours so force int.
-                cal = int(int_cal - 2208988800 + self._utc * 3600)
-                cal = time.localtime(cal)
-                return cal
+        # wait, up to the socket timeout, for the response
+        data = self._sock.recv(_NTP_PACKET_SIZE)
+        if len(data) < _NTP_PACKET_SIZE:
+            raise RuntimeError("Failed to receive a response from the NTP server.")
+        int_cal = struct.unpack_from(_NTP_SEC, data, _NTP_SEC_OFFSET)[0]
+        cal = int_cal - 2208988800 + self._utc_seconds
+        self._last_sync_monotonic = time.monotonic()
+        self._last_sync_epoch = cal
+        cal = time.localtime(cal)
+        return cal
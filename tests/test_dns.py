@@ -0,0 +1,291 @@
+# SPDX-FileCopyrightText: 2022 Martin Stephens
+#
+# SPDX-License-Identifier: MIT
+"""Tests for the DNS client."""
+# pylint: disable=no-self-use, redefined-outer-name, protected-access, invalid-name
+import pytest
+import adafruit_wiznet5k.adafruit_wiznet5k_dns as wiz_dns
+
+DNS_SERVER = (8, 8, 8, 8)
+
+
+@pytest.fixture
+def wiznet(mocker):
+    return mocker.patch("adafruit_wiznet5k.adafruit_wiznet5k.WIZNET5K", autospec=True)
+
+
+@pytest.fixture
+def wrench(mocker):
+    return mocker.patch("adafruit_wiznet5k.adafruit_wiznet5k_dns.socket", autospec=True)
+
+
+@pytest.fixture
+def mock_time(mocker):
+    mock = mocker.patch("adafruit_wiznet5k.adafruit_wiznet5k_dns.time", autospec=True)
+    mock.monotonic.return_value = 1000.0
+    return mock
+
+
+def dns_response(request_id, ttl=300, address=b"\x0a\x01\x02\x03"):
+    """Build a response to a type A query for adafruit.com."""
+    return (
+        request_id.to_bytes(2, "big")
+        + b"\x81\x80\x00\x01\x00\x01\x00\x00\x00\x00"
+        + b"\x08adafruit\x03com\x00\x00\x01\x00\x01"
+        + b"\xc0\x0c\x00\x01\x00\x01"
+        + ttl.to_bytes(4, "big")
+        + b"\x00\x04"
+        + address
+    )
+
+
+def reply_to_request(dns_client, wrench, **kwargs):
+    """Make the mock socket answer whichever request the client sends."""
+    sock = wrench.socket.return_value
+    sock.recv.side_effect = lambda *args: dns_response(dns_client._request_id, **kwargs)
+    return sock
+
+
+class TestDNSInit:
+    @pytest.mark.usefixtures("wrench")
+    def test_server_address_string_is_parsed(self, wiznet):
+        wiznet.unpretty_ip.return_value = b"\x08\x08\x04\x04"
+        dns_client = wiz_dns.DNS(wiznet, "8.8.4.4")
+        wiznet.unpretty_ip.assert_called_once_with("8.8.4.4")
+        assert dns_client._dns_server == (8, 8, 4, 4)
+
+    @pytest.mark.usefixtures("wrench")
+    def test_server_address_tuple_is_kept(self, wiznet):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        wiznet.unpretty_ip.assert_not_called()
+        assert dns_client._dns_server == DNS_SERVER
+
+
+class TestDNSCache:
+    @pytest.mark.usefixtures("mock_time")
+    def test_cache_hit_skips_network(self, wiznet, wrench):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        sock = reply_to_request(dns_client, wrench)
+
+        assert dns_client.gethostbyname(b"adafruit.com") == b"\x0a\x01\x02\x03"
+        assert sock.sendto.call_count == 1
+        assert dns_client.gethostbyname(b"AdaFruit.com") == b"\x0a\x01\x02\x03"
+        assert dns_client.gethostbyname("adafruit.com") == b"\x0a\x01\x02\x03"
+        assert sock.sendto.call_count == 1
+
+    @pytest.mark.usefixtures("mock_time")
+    def test_socket_is_reused(self, wiznet, wrench):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        sock = reply_to_request(dns_client, wrench)
+
+        dns_client.gethostbyname(b"adafruit.com")
+        dns_client.gethostbyname(b"www.adafruit.com")
+        wrench.socket.assert_called_once()
+        sock.bind.assert_called_once_with((None, wiz_dns.DNS_PORT))
+        assert sock.sendto.call_args[0][1] == (DNS_SERVER, wiz_dns.DNS_PORT)
+        sock.close.assert_not_called()
+        dns_client.close()
+        sock.close.assert_called_once()
+        assert dns_client._sock is None
+
+    @pytest.mark.parametrize(
+        "ttl, expected", ((0, wiz_dns.MIN_TTL), (300, 300), (86400, wiz_dns.MAX_TTL))
+    )
+    @pytest.mark.usefixtures("mock_time")
+    def test_ttl_is_clamped(self, wiznet, wrench, ttl, expected):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        reply_to_request(dns_client, wrench, ttl=ttl)
+
+        dns_client.gethostbyname(b"adafruit.com")
+        assert dns_client._cache[b"adafruit.com"][1] == 1000.0 + expected
+
+    def test_expired_entry_is_refreshed(self, wiznet, wrench, mock_time):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        sock = reply_to_request(dns_client, wrench, ttl=300)
+
+        dns_client.gethostbyname(b"adafruit.com")
+        mock_time.monotonic.return_value = 1301.0
+        dns_client.gethostbyname(b"adafruit.com")
+        assert sock.sendto.call_count == 2
+
+    @pytest.mark.usefixtures("mock_time")
+    def test_flush(self, wiznet, wrench):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        sock = reply_to_request(dns_client, wrench)
+
+        dns_client.gethostbyname(b"adafruit.com")
+        dns_client.flush()
+        dns_client.gethostbyname(b"adafruit.com")
+        assert sock.sendto.call_count == 2
+
+    def test_expired_entries_are_purged(self, wiznet, wrench, mock_time):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        reply_to_request(dns_client, wrench, ttl=300)
+
+        dns_client.gethostbyname(b"adafruit.com")
+        mock_time.monotonic.return_value = 1301.0
+        dns_client.gethostbyname(b"www.adafruit.com")
+        assert list(dns_client._cache) == [b"www.adafruit.com"]
+
+    def test_cache_size_is_capped(self, wiznet, wrench, mock_time):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        reply_to_request(dns_client, wrench, ttl=300)
+
+        for i in range(wiz_dns._MAX_CACHE_ENTRIES + 1):
+            mock_time.monotonic.return_value = 1000.0 + i
+            dns_client.gethostbyname(b"host%d.adafruit.com" % i)
+        assert len(dns_client._cache) == wiz_dns._MAX_CACHE_ENTRIES
+        assert b"host0.adafruit.com" not in dns_client._cache
+
+    def test_timeout_is_cached(self, wiznet, wrench, mock_time):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        sock = wrench.socket.return_value
+        # No response to any attempt.
+        sock.recv.return_value = b""
+
+        assert dns_client.gethostbyname(b"adafruit.com") == wiz_dns.TIMED_OUT
+        send_count = sock.sendto.call_count
+        assert dns_client.gethostbyname(b"adafruit.com") == wiz_dns.TIMED_OUT
+        assert sock.sendto.call_count == send_count
+        mock_time.monotonic.return_value = 1000.0 + wiz_dns.NEGATIVE_TTL + 1
+        dns_client.gethostbyname(b"adafruit.com")
+        assert sock.sendto.call_count == 2 * send_count
+
+    @pytest.mark.usefixtures("mock_time")
+    def test_invalid_response_is_cached(self, wiznet, wrench):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        sock = wrench.socket.return_value
+        # NXDOMAIN, no answers.
+        sock.recv.side_effect = lambda *args: (
+            dns_client._request_id.to_bytes(2, "big")
+            + b"\x81\x83\x00\x01\x00\x00\x00\x00\x00\x00"
+        )
+
+        assert dns_client.gethostbyname(b"adafruit.con") == wiz_dns.INVALID_RESPONSE
+        assert sock.recv.call_count == 1
+        assert dns_client.gethostbyname(b"adafruit.con") == wiz_dns.INVALID_RESPONSE
+        assert sock.sendto.call_count == 1
+
+    @pytest.mark.usefixtures("mock_time")
+    def test_truncated_response_is_not_cached(self, wiznet, wrench):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        sock = wrench.socket.return_value
+        sock.recv.side_effect = lambda *args: (
+            dns_client._request_id.to_bytes(2, "big")
+            + b"\x83\x80\x00\x01\x00\x00\x00\x00\x00\x00"
+        )
+
+        assert dns_client.gethostbyname(b"adafruit.com") == wiz_dns.TRUNCATED
+        assert dns_client.gethostbyname(b"adafruit.com") == wiz_dns.TRUNCATED
+        assert sock.sendto.call_count == 2
+
+    @pytest.mark.usefixtures("mock_time")
+    def test_request_is_resent_after_timeout(self, wiznet, wrench):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        sock = wrench.socket.return_value
+        sock.recv.return_value = b""
+
+        assert dns_client.gethostbyname(b"adafruit.com") == wiz_dns.TIMED_OUT
+        assert sock.sendto.call_count == 3
+        assert [c.args[0] for c in sock.settimeout.call_args_list] == [1.0, 0.5, 0.25]
+
+    def test_stray_response_is_skipped(self, wiznet, wrench, mock_time):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        sock = wrench.socket.return_value
+        responses = []
+        sock.recv.side_effect = lambda *args: responses.pop(0)
+
+        def send_request(*_args):
+            # a late answer to an earlier request arrives before this one's
+            responses.append(dns_response((dns_client._request_id + 1) & 0xFFFF))
+            responses.append(dns_response(dns_client._request_id))
+
+        sock.sendto.side_effect = send_request
+        mock_time.monotonic.side_effect = [1000.0, 1000.25, 1000.5]
+
+        assert dns_client.gethostbyname(b"adafruit.com") == b"\x0a\x01\x02\x03"
+        assert sock.sendto.call_count == 1
+        assert [c.args[0] for c in sock.settimeout.call_args_list] == [1.0, 0.75]
+
+
+class TestBuildQuery:
+    @pytest.mark.usefixtures("wrench")
+    def test_query_packet(self, mocker, wiznet):
+        mocker.patch(
+            "adafruit_wiznet5k.adafruit_wiznet5k_dns.getrandbits", return_value=0x1234
+        )
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        dns_client._host = b"adafruit.com"
+        dns_client._build_dns_query()
+        assert dns_client._pkt_buf == (
+            b"\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00"
+            b"\x08adafruit\x03com\x00\x00\x01\x00\x01"
+        )
+
+    @pytest.mark.usefixtures("wrench")
+    def test_query_buffer_is_reused(self, wiznet):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        pkt_buf = dns_client._pkt_buf
+        for host, question in (
+            (b"www.adafruit.com", b"\x03www\x08adafruit\x03com"),
+            (b"adafruit.com", b"\x08adafruit\x03com"),
+            (b"learn.adafruit.com", b"\x05learn\x08adafruit\x03com"),
+        ):
+            dns_client._host = host
+            dns_client._build_dns_query()
+            assert dns_client._pkt_buf is pkt_buf
+            assert pkt_buf[12:] == question + b"\x00\x00\x01\x00\x01"
+
+
+class TestParseResponse:
+    def test_no_response(self, wiznet, wrench):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        dns_client._sock = wrench.socket(type=wrench.SOCK_DGRAM)
+        dns_client._sock.recv.return_value = b""
+        assert dns_client._parse_dns_response(1.0) == (wiz_dns.TIMED_OUT, 0)
+        dns_client._sock.recv.assert_called_once_with(512)
+        dns_client._sock.available.assert_not_called()
+
+    def test_cname_chain(self, wiznet, wrench):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        dns_client._request_id = 0x4242
+        dns_client._sock = wrench.socket(type=wrench.SOCK_DGRAM)
+        dns_client._sock.recv.return_value = (
+            b"\x42\x42\x81\x80\x00\x01\x00\x02\x00\x00\x00\x00"
+            b"\x03www\x08adafruit\x03com\x00\x00\x01\x00\x01"
+            # CNAME www.adafruit.com -> cdn.adafruit.com
+            b"\xc0\x0c\x00\x05\x00\x01\x00\x00\x00\x78\x00\x06\x03cdn\xc0\x10"
+            # A cdn.adafruit.com
+            b"\x03cdn\xc0\x10\x00\x01\x00\x01\x00\x00\x0e\x10\x00\x04\x0a\x01\x02\x03"
+        )
+        assert dns_client._parse_dns_response(1.0) == (b"\x0a\x01\x02\x03", 120)
+
+    @pytest.mark.parametrize(
+        "length",
+        (
+            12,  # header only
+            20,  # inside the question name
+            32,  # inside QTYPE / QCLASS
+            36,  # inside the answer name
+            40,  # inside the fixed part of the answer
+            43,  # inside the address
+        ),
+    )
+    def test_short_response(self, wiznet, wrench, length):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        dns_client._request_id = 0x4242
+        dns_client._sock = wrench.socket(type=wrench.SOCK_DGRAM)
+        dns_client._sock.recv.return_value = dns_response(0x4242)[:length]
+        assert dns_client._parse_dns_response(1.0) == (wiz_dns.INVALID_RESPONSE, 0)
+
+    def test_short_skipped_answer(self, wiznet, wrench):
+        dns_client = wiz_dns.DNS(wiznet, DNS_SERVER)
+        dns_client._request_id = 0x4242
+        dns_client._sock = wrench.socket(type=wrench.SOCK_DGRAM)
+        dns_client._sock.recv.return_value = (
+            b"\x42\x42\x81\x80\x00\x01\x00\x02\x00\x00\x00\x00"
+            b"\x03www\x08adafruit\x03com\x00\x00\x01\x00\x01"
+            # CNAME claiming more data than the packet holds
+            b"\xc0\x0c\x00\x05\x00\x01\x00\x00\x00\x78\x00\x20\x03cdn\xc0\x10"
+        )
+        assert dns_client._parse_dns_response(1.0) == (wiz_dns.INVALID_RESPONSE, 0)
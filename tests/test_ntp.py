@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: 2022 Martin Stephens
+#
+# SPDX-License-Identifier: MIT
+"""Tests for the NTP client."""
+# pylint: disable=no-self-use, redefined-outer-name, protected-access, invalid-name
+import pytest
+import adafruit_wiznet5k.adafruit_wiznet5k_ntp as wiz_ntp
+
+NTP_SERVER = "192.168.1.1"
+NTP_SECONDS = 3900000000
+UNIX_SECONDS = NTP_SECONDS - 2208988800
+
+
+@pytest.fixture
+def wiznet(mocker):
+    return mocker.patch("adafruit_wiznet5k.adafruit_wiznet5k.WIZNET5K", autospec=True)
+
+
+@pytest.fixture
+def wrench(mocker):
+    return mocker.patch("adafruit_wiznet5k.adafruit_wiznet5k_ntp.socket", autospec=True)
+
+
+@pytest.fixture
+def mock_time(mocker):
+    mock = mocker.patch("adafruit_wiznet5k.adafruit_wiznet5k_ntp.time", autospec=True)
+    mock.monotonic.return_value = 1000.0
+    return mock
+
+
+def ntp_response(seconds=NTP_SECONDS):
+    """Build a server response with the given transmit timestamp seconds."""
+    return bytes(40) + seconds.to_bytes(4, "big") + bytes(4)
+
+
+@pytest.fixture
+def sock(wrench):
+    mock = wrench.socket.return_value
+    mock.recv.return_value = ntp_response()
+    return mock
+
+
+class TestGetTime:
+    def test_local_clock_used_within_min_resync(self, wiznet, sock, mock_time):
+        ntp_client = wiz_ntp.NTP(wiznet, NTP_SERVER, 0)
+
+        ntp_client.get_time()
+        mock_time.monotonic.return_value = 1059.5
+        ntp_client.get_time()
+        assert sock.sendto.call_count == 1
+        mock_time.localtime.assert_called_with(UNIX_SECONDS + 59)
+
+    def test_resync_after_min_resync(self, wiznet, sock, mock_time):
+        ntp_client = wiz_ntp.NTP(wiznet, NTP_SERVER, 0, min_resync=30)
+
+        ntp_client.get_time()
+        mock_time.monotonic.return_value = 1030.0
+        sock.recv.return_value = ntp_response(NTP_SECONDS + 31)
+        ntp_client.get_time()
+        assert sock.sendto.call_count == 2
+        mock_time.localtime.assert_called_with(UNIX_SECONDS + 31)
+
+    @pytest.mark.usefixtures("mock_time")
+    def test_min_resync_zero_always_resyncs(self, wiznet, sock):
+        ntp_client = wiz_ntp.NTP(wiznet, NTP_SERVER, 0, min_resync=0)
+
+        ntp_client.get_time()
+        ntp_client.get_time()
+        assert sock.sendto.call_count == 2
+
+    @pytest.mark.usefixtures("mock_time")
+    @pytest.mark.parametrize("data", (b"", bytes(20)))
+    def test_no_response_raises(self, wiznet, sock, data):
+        ntp_client = wiz_ntp.NTP(wiznet, NTP_SERVER, 0)
+        sock.recv.return_value = data
+
+        with pytest.raises(RuntimeError):
+            ntp_client.get_time()
+        sock.recv.assert_called_once_with(48)
+
+    @pytest.mark.usefixtures("sock")
+    @pytest.mark.parametrize(
+        "utc, offset", ((5.5, 19800), (-3.5, -12600), (5.75, 20700), (1, 3600))
+    )
+    def test_utc_offset(self, wiznet, mock_time, utc, offset):
+        ntp_client = wiz_ntp.NTP(wiznet, NTP_SERVER, utc)
+
+        ntp_client.get_time()
+        mock_time.localtime.assert_called_once_with(UNIX_SECONDS + offset)